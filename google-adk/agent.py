@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import json
 import os
 from typing import Dict, Any
@@ -8,14 +9,16 @@ from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
 from google.genai.types import Content, Part
+from llm_cache import serve_cached_response, store_response
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure Google AI API
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("Please set the GOOGLE_API_KEY environment variable")
+@functools.lru_cache(maxsize=1)
+def ensure_env():
+    """Loads the .env file and checks the Google AI API key is set."""
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("Please set the GOOGLE_API_KEY environment variable")
+    return api_key
 
 async def get_tools_async():
     """Gets tools from the NOAA Tides MCP Server."""
@@ -32,6 +35,7 @@ async def get_tools_async():
 
 async def get_agent_async():
     """Creates and returns the agent with MCP tools."""
+    ensure_env()
     tools, exit_stack = await get_tools_async()
     
     agent = LlmAgent(
@@ -40,11 +44,15 @@ async def get_agent_async():
         instruction='''You are an agent that provides NOAA tide and water level information. 
         When asked about a location:
         1. First use search_stations to find the appropriate station ID for the location
-        2. Then use get_tide_predictions to get the tide information
+        2. Then use get_station_summary to get the station details and tide predictions together,
+           or get_tide_predictions if only the tides are needed
         3. Format the response in a clear, readable way. For example listing just the next 2 high and low tides
         
         Use the available tools to answer questions about tides, water levels, and station information.''',
-        tools=tools
+        tools=tools,
+        # Answer repeated queries from the local response cache
+        before_model_callback=serve_cached_response,
+        after_model_callback=store_response
     )
     
     return agent, exit_stack
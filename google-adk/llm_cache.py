@@ -0,0 +1,79 @@
+"""
+Persistent cache of model responses for the NOAA Tides agent.
+
+Register serve_cached_response and store_response as an LlmAgent's
+before_model_callback and after_model_callback. Requests are keyed by their
+full contents (system instruction, tool declarations and conversation so far),
+so a repeated query is answered without calling the model.
+"""
+
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+
+# Used unless LLM_CACHE_PATH is set (e.g. in .env)
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3")
+
+_connection: Optional[sqlite3.Connection] = None
+
+# Cache key of the model call in flight for each invocation
+_pending_keys: Dict[str, str] = {}
+
+def _get_connection() -> sqlite3.Connection:
+    """
+    Open the cache database on first use.
+    
+    LLM_CACHE_PATH is read here rather than at import, so a value loaded from
+    .env after this module is imported still applies.
+    """
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH))
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+        )
+    return _connection
+
+def _request_key(llm_request: LlmRequest) -> str:
+    """Hash everything sent to the model into a cache key."""
+    payload = llm_request.model_dump_json(include={"model", "contents", "config"})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def serve_cached_response(
+    callback_context: CallbackContext,
+    llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """Return the cached response for this request, skipping the model call."""
+    key = _request_key(llm_request)
+    row = _get_connection().execute(
+        "SELECT response FROM responses WHERE key = ?", (key,)
+    ).fetchone()
+    if row:
+        return LlmResponse.model_validate_json(row[0])
+
+    _pending_keys[callback_context.invocation_id] = key
+    return None
+
+def store_response(
+    callback_context: CallbackContext,
+    llm_response: LlmResponse
+) -> Optional[LlmResponse]:
+    """Save a complete, successful model response under its request's key."""
+    if llm_response.partial:
+        return None
+
+    key = _pending_keys.pop(callback_context.invocation_id, None)
+    if key is None or llm_response.error_code:
+        return None
+
+    connection = _get_connection()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)",
+            (key, llm_response.model_dump_json(exclude_none=True))
+        )
+    return None
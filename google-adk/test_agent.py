@@ -1,26 +1,52 @@
 import asyncio
+import functools
 import pytest
+import pytest_asyncio
 import os
+import sys
+from contextlib import AsyncExitStack
 from pathlib import Path
 from typing import Dict, Any
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
+from google.adk.tools import FunctionTool
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, StdioServerParameters
 from google.genai.types import Content, Part
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
 # Get the absolute path to the server.py file
 SERVER_PATH = str(Path(__file__).parent.parent / 'server.py')
 
+# Import the server's tool functions so most tests can call them in-process.
+# The server keeps one HTTP client for the process, so the tests share an
+# event loop (loop_scope="session") with the agent fixture below.
+sys.path.insert(0, str(Path(SERVER_PATH).parent))
+import server
+
 # Test data
 TEST_STATION_ID = "8571892"  # Cambridge, MD
 TEST_LOCATION = "Cambridge, MD"
 TEST_DATE = "20240311"  # March 11, 2024
 
+def get_local_tools():
+    """Wraps the NOAA Tides server's tool functions as in-process ADK tools."""
+    return [
+        FunctionTool(tool)
+        for tool in (
+            server.search_stations,
+            server.get_station_info,
+            server.get_station_summary,
+            server.get_tide_predictions,
+            server.get_water_levels
+        )
+    ]
+
+@functools.lru_cache(maxsize=1)
+def load_env():
+    """Loads environment variables from the .env file on first use."""
+    load_dotenv()
+
 async def get_tools_async():
     """Gets tools from the NOAA Tides MCP Server."""
     print("\nConnecting to MCP NOAA Tides server...")
@@ -33,9 +59,18 @@ async def get_tools_async():
     print(f"Connected successfully. Fetched {len(tools)} tools.")
     return tools, exit_stack
 
-async def get_agent_async():
-    """Creates and returns the agent with MCP tools."""
-    tools, exit_stack = await get_tools_async()
+async def get_agent_async(in_process=True):
+    """
+    Creates and returns the agent with NOAA Tides tools.
+    
+    Tools are called in-process by default, skipping the server subprocess and
+    stdio round-trips. Pass in_process=False to go through the MCP server.
+    """
+    load_env()
+    if in_process:
+        tools, exit_stack = get_local_tools(), AsyncExitStack()
+    else:
+        tools, exit_stack = await get_tools_async()
     
     agent = LlmAgent(
         model='gemini-1.5-pro',
@@ -43,7 +78,8 @@ async def get_agent_async():
         instruction='''You are an agent that provides NOAA tide and water level information. 
         When asked about a location:
         1. First use search_stations to find the appropriate station ID for the location
-        2. Then use get_tide_predictions to get the tide information
+        2. Then use get_station_summary to get the station details and tide predictions together,
+           or get_tide_predictions if only the tides are needed
         3. Format the response in a clear, readable way. For example listing just the next 2 high and low tides
         
         Use the available tools to answer questions about tides, water levels, and station information.''',
@@ -66,12 +102,17 @@ async def process_events(events_async):
     except Exception as e:
         print(f"Error processing events: {e}")
 
-@pytest.mark.asyncio
-async def test_search_stations():
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def agent():
+    """Builds the in-process agent once for the whole test run."""
+    root_agent, exit_stack = await get_agent_async()
+    yield root_agent
+    await exit_stack.aclose()
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_stations(agent):
     """Test the search_stations tool."""
     print("\n=== Testing search_stations ===")
-    agent, exit_stack = await get_agent_async()
-    
     # Create session
     session_service = InMemorySessionService()
     session = session_service.create_session(
@@ -98,14 +139,11 @@ async def test_search_stations():
     )
     
     await process_events(events_async)
-    await exit_stack.aclose()
 
-@pytest.mark.asyncio
-async def test_get_station_info():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_station_info(agent):
     """Test the get_station_info tool."""
     print("\n=== Testing get_station_info ===")
-    agent, exit_stack = await get_agent_async()
-    
     # Create session
     session_service = InMemorySessionService()
     session = session_service.create_session(
@@ -132,14 +170,11 @@ async def test_get_station_info():
     )
     
     await process_events(events_async)
-    await exit_stack.aclose()
 
-@pytest.mark.asyncio
-async def test_get_tide_predictions():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_tide_predictions(agent):
     """Test the get_tide_predictions tool."""
     print("\n=== Testing get_tide_predictions ===")
-    agent, exit_stack = await get_agent_async()
-    
     # Create session
     session_service = InMemorySessionService()
     session = session_service.create_session(
@@ -166,14 +201,11 @@ async def test_get_tide_predictions():
     )
     
     await process_events(events_async)
-    await exit_stack.aclose()
 
-@pytest.mark.asyncio
-async def test_get_water_levels():
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_water_levels(agent):
     """Test the get_water_levels tool."""
     print("\n=== Testing get_water_levels ===")
-    agent, exit_stack = await get_agent_async()
-    
     # Create session
     session_service = InMemorySessionService()
     session = session_service.create_session(
@@ -200,21 +232,15 @@ async def test_get_water_levels():
     )
     
     await process_events(events_async)
-    await exit_stack.aclose()
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_integration():
     """Integration test combining all tools."""
     print("\n=== Running Integration Test ===")
-    agent, exit_stack = await get_agent_async()
+    # End-to-end through the MCP server over stdio
+    agent, exit_stack = await get_agent_async(in_process=False)
     
-    # Create session
     session_service = InMemorySessionService()
-    session = session_service.create_session(
-        state={},
-        app_name='noaa_tides_app',
-        user_id='test_user'
-    )
     
     # Test queries
     queries = [
@@ -230,7 +256,14 @@ async def test_integration():
         session_service=session_service,
     )
     
-    for query in queries:
+    async def run_query(query):
+        # Each query gets its own session so the queries can run concurrently
+        session = session_service.create_session(
+            state={},
+            app_name='noaa_tides_app',
+            user_id='test_user'
+        )
+        
         print(f"\nQuery: {query}")
         content = Content(role='user', parts=[Part(text=query)])
         
@@ -242,6 +275,8 @@ async def test_integration():
         
         await process_events(events_async)
     
+    await asyncio.gather(*(run_query(query) for query in queries))
+    
     await exit_stack.aclose()
 
 if __name__ == '__main__':
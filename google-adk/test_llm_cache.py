@@ -0,0 +1,51 @@
+import pytest
+from types import SimpleNamespace
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai.types import Content, Part
+
+import llm_cache
+
+@pytest.fixture(autouse=True)
+def cache_db(tmp_path, monkeypatch):
+    """Point the cache at a fresh database for each test."""
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_connection", None)
+    llm_cache._pending_keys.clear()
+    yield
+    if llm_cache._connection is not None:
+        llm_cache._connection.close()
+    llm_cache._pending_keys.clear()
+
+def make_request(text="What are the tides in Cambridge, MD?"):
+    return LlmRequest(
+        model="gemini-1.5-pro",
+        contents=[Content(role="user", parts=[Part(text=text)])]
+    )
+
+def make_response(**kwargs):
+    return LlmResponse(content=Content(role="model", parts=[Part(text="High tide at 3:12 PM")]), **kwargs)
+
+def test_miss_then_store_then_hit(tmp_path):
+    """Test that a stored response is served for the same request."""
+    context = SimpleNamespace(invocation_id="invocation-1")
+    assert llm_cache.serve_cached_response(context, make_request()) is None
+    assert llm_cache.store_response(context, make_response()) is None
+    assert (tmp_path / "llm_cache.sqlite3").exists()
+
+    cached = llm_cache.serve_cached_response(SimpleNamespace(invocation_id="invocation-2"), make_request())
+    assert cached.content.parts[0].text == "High tide at 3:12 PM"
+
+    # A different conversation is still a miss
+    assert llm_cache.serve_cached_response(context, make_request("Water levels in Annapolis?")) is None
+
+@pytest.mark.parametrize("response", [
+    pytest.param(make_response(partial=True), id="partial"),
+    pytest.param(make_response(error_code="SAFETY"), id="error"),
+])
+def test_incomplete_responses_are_not_stored(response):
+    """Test that partial and error responses are never cached."""
+    context = SimpleNamespace(invocation_id="invocation-1")
+    assert llm_cache.serve_cached_response(context, make_request()) is None
+    llm_cache.store_response(context, response)
+
+    assert llm_cache.serve_cached_response(context, make_request()) is None
@@ -1,12 +1,30 @@
 from mcp.server.fastmcp import FastMCP
 import httpx
-from typing import Optional, List, Dict
-from datetime import datetime, timedelta
+import ijson
+from typing import Optional, List, Dict, Union
+from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from types import MappingProxyType
+from urllib.parse import urlencode
+import functools
 import json
+import operator
+import re
 import sys
+import time
 import asyncio
 import logging
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # the standard library decoder also accepts bytes
+    from json import loads as _json_loads
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,11 +41,318 @@ logger.info("NOAA Tides MCP Server starting up...")
 DATA_URL = "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter"
 METADATA_URL = "https://api.tidesandcurrents.noaa.gov/mdapi/prod/webapi/stations"
 
+# Shared HTTP client so tool calls reuse pooled keep-alive connections
+# instead of paying a fresh TCP connect and TLS handshake every time
+_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(10.0),
+    limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
+)
+
+# Cache lifetimes in seconds. Observed water levels update every 6 minutes,
+# predictions and station metadata rarely change, and the full station
+# catalog is effectively static.
+WATER_LEVEL_TTL = 60
+PREDICTION_TTL = 300
+STATION_INFO_TTL = 300
+STATION_CATALOG_TTL = 24 * 60 * 60
+CACHE_MAXSIZE = 512
+
+# Clock for cache expiry; monotonic so wall-clock changes don't affect TTLs
+_now_ns = time.monotonic_ns
+_NS_PER_SECOND = 1_000_000_000
+
+# Today's UTC date for cache keys and when to recompute it
+_today = ""
+_today_expires_ns = 0
+
+# In-process response cache: key -> (expires_ns, data), kept in LRU order
+_cache: OrderedDict = OrderedDict()
+_inflight: Dict[tuple, asyncio.Future] = {}
+
+# Indexed station catalog used by search_stations. Holds the raw station
+# records, per-station lowercased search fields, an inverted index of
+# token -> station positions, and the _now_ns() time it was loaded.
+_catalog: Dict = {}
+_catalog_task: Optional[asyncio.Task] = None
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Water level and prediction stations have 7-digit IDs; anything else is
+# rejected without a request. Metadata also covers current stations, whose
+# IDs are alphanumeric (e.g. cb0102), so it only needs a safe path segment.
+_STATION_RE = re.compile(r"[0-9]{7}")
+_METADATA_STATION_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Query parameters sent with every Data API request, plus read-only
+# per-product templates so each call only adds its station-specific values
+_DATAGETTER_DEFAULTS = {"format": "json", "application": "MCP_NOAA_Tides"}
+_WATER_LEVEL_PARAMS = MappingProxyType({**_DATAGETTER_DEFAULTS, "product": "water_level"})
+_PREDICTION_PARAMS = MappingProxyType({**_DATAGETTER_DEFAULTS, "product": "predictions"})
+
+# Station record fields kept from the catalog; the rest are discarded while parsing
+_CATALOG_FIELDS = ("id", "name", "state", "lat", "lng", "type", "observedst", "products")
+
+def _utc_today() -> str:
+    """
+    Return today's UTC date in yyyyMMdd format.
+    
+    The date is recomputed at most once a minute and at midnight, so most
+    calls only compare against the monotonic clock.
+    """
+    global _today, _today_expires_ns
+    now_ns = _now_ns()
+    if now_ns >= _today_expires_ns:
+        now = datetime.now(timezone.utc)
+        next_midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        refresh_in = min(60.0, (next_midnight - now).total_seconds())
+        _today = now.strftime("%Y%m%d")
+        _today_expires_ns = now_ns + int(refresh_in * _NS_PER_SECOND)
+    return _today
+
+async def _request_json(url: Union[str, httpx.URL], params: Optional[Dict] = None) -> Dict:
+    """Perform a GET request and return the decoded JSON body, or an error for a failed status."""
+    response = await _client.get(url, params=params)
+    if response.is_error:
+        return {"error": f"HTTP {response.status_code} {response.reason_phrase}"}
+    return _json_loads(response.content)
+
+async def _stream_json(url: Union[str, httpx.URL], params: Optional[Dict] = None) -> Dict:
+    """
+    Perform a GET request and decode the JSON body as it downloads.
+    
+    Used for date-range requests, whose data arrays can run to tens of
+    thousands of samples, so the raw body is never held in memory whole.
+    """
+    members = ijson.sendable_list()
+    parser = ijson.kvitems_coro(members, "", use_float=True)
+    async with _client.stream("GET", url, params=params) as response:
+        if response.is_error:
+            return {"error": f"HTTP {response.status_code} {response.reason_phrase}"}
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+    parser.close()
+    return dict(members)
+
+async def _fetch_json(
+    url: Union[str, httpx.URL],
+    params: Optional[Dict] = None,
+    ttl: float = PREDICTION_TTL,
+    today: bool = False,
+    stream: bool = False
+) -> Dict:
+    """
+    Fetch a JSON document, serving repeats from an in-process TTL cache.
+    
+    Relative requests (date=today) are keyed by the current UTC date so they
+    roll over at midnight. The date=today parameter itself is still sent to
+    NOAA, which resolves it in the requested time zone. Concurrent misses for
+    the same key share a single request, and NOAA error payloads are never
+    cached.
+    
+    Args:
+        url: The URL to request
+        params: Query parameters (optional)
+        ttl: Seconds to keep a successful response
+        today: Whether the request is relative to today's date
+        stream: Decode the body incrementally as it downloads
+    
+    Returns:
+        Dictionary containing the decoded response
+    """
+    key = (url, tuple(sorted(params.items())) if params else (), _utc_today() if today else None)
+    entry = _cache.get(key)
+    if entry and entry[0] > _now_ns():
+        _cache.move_to_end(key)
+        return entry[1]
+    
+    task = _inflight.get(key)
+    if task is None:
+        request = _stream_json if stream else _request_json
+        task = asyncio.ensure_future(request(url, params))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    data = await asyncio.shield(task)
+    
+    if "error" not in data:
+        _cache[key] = (_now_ns() + int(ttl * _NS_PER_SECOND), data)
+        _cache.move_to_end(key)
+        if len(_cache) > CACHE_MAXSIZE:
+            _cache.popitem(last=False)
+    return data
+
+def _available_products(station: Dict) -> Dict:
+    """Summarize which data products a station record offers."""
+    product_names = {product.get("name") for product in station.get("products", {}).get("products", [])}
+    return {
+        "tide_predictions": "Tide Predictions" in product_names,
+        "water_levels": station.get("observedst", False),
+        "currents": station.get("type") == "currents",
+        "is_active": station.get("observedst", False)
+    }
+
+def _build_station_index(stations: List[Dict]) -> tuple:
+    """
+    Preprocess the station catalog for searching.
+    
+    Args:
+        stations: Station records from the NOAA Metadata API
+    
+    Returns:
+        Tuple of (per-station metadata, inverted index of token -> station positions)
+    """
+    meta = []
+    index: Dict[str, set] = {}
+    # Bound once here rather than looked up for every station and token
+    append_meta = meta.append
+    findall = _TOKEN_RE.findall
+    setdefault = index.setdefault
+    for i, station in enumerate(stations):
+        name_lc = (station.get("name") or "").lower()
+        state_lc = (station.get("state") or "").lower()
+        station["available_products"] = _available_products(station)
+        # Name and state on separate lines so a fallback match can't span both
+        search_text = f"{name_lc}\n{state_lc}"
+        append_meta({"name_lc": name_lc, "state_lc": state_lc, "search_text": search_text})
+        for token in findall(search_text):
+            setdefault(token, set()).add(i)
+    return meta, index
+
+async def _load_station_catalog() -> None:
+    """
+    Download the full station catalog and rebuild the search index.
+    
+    The catalog is several megabytes of JSON, so it is parsed incrementally as
+    it downloads, keeping only the fields needed for search results. The index
+    is then built in a worker thread so other tool calls keep being served.
+    """
+    stations = []
+    parsed = ijson.sendable_list()
+    parser = ijson.items_coro(parsed, "stations.item", use_float=True)
+    
+    def add_parsed_stations() -> None:
+        for record in parsed:
+            stations.append({field: record[field] for field in _CATALOG_FIELDS if field in record})
+        del parsed[:]
+    
+    async with _client.stream("GET", f"{METADATA_URL}.json") as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            add_parsed_stations()
+    parser.close()
+    add_parsed_stations()
+    
+    meta, index = await asyncio.to_thread(_build_station_index, stations)
+    _catalog.update(stations=stations, meta=meta, index=index, loaded_at=_now_ns())
+    logger.info("Indexed %d stations", len(stations))
+
+def _on_catalog_loaded(task: asyncio.Task) -> None:
+    """Clear the pending catalog load and log it if it failed."""
+    global _catalog_task
+    _catalog_task = None
+    if not task.cancelled() and task.exception():
+        logger.error("Error loading station catalog", exc_info=task.exception())
+
+def _refresh_station_catalog() -> asyncio.Task:
+    """Start reloading the station catalog in the background unless already running."""
+    global _catalog_task
+    if _catalog_task is None:
+        _catalog_task = asyncio.ensure_future(_load_station_catalog())
+        _catalog_task.add_done_callback(_on_catalog_loaded)
+    return _catalog_task
+
+async def _get_station_catalog() -> Dict:
+    """
+    Return the indexed station catalog, loading it on first use.
+    
+    Once the catalog is older than STATION_CATALOG_TTL it is refreshed in the
+    background while searches keep using the existing index.
+    """
+    if "loaded_at" not in _catalog:
+        await asyncio.shield(_refresh_station_catalog())
+    elif _now_ns() - _catalog["loaded_at"] > STATION_CATALOG_TTL * _NS_PER_SECOND:
+        _refresh_station_catalog()
+    return _catalog
+
+async def _get(
+    url: Union[str, httpx.URL],
+    params: Optional[Dict],
+    ttl: float,
+    resource: str,
+    station_id: str,
+    today: bool = False,
+    stream: bool = False
+) -> Dict:
+    """
+    Fetch a NOAA API resource, logging the outcome.
+    
+    Args:
+        url: The URL to request
+        params: Query parameters (optional)
+        ttl: Seconds to cache a successful response
+        resource: What is being fetched, for log messages
+        station_id: The station it is fetched for, for log messages
+        today: Whether the request is relative to today's date
+        stream: Decode the body incrementally as it downloads
+    
+    Returns:
+        Dictionary containing the response, or an "error" key if the request failed
+    """
+    logger.info("Getting %s for station %s", resource, station_id)
+    try:
+        data = await _fetch_json(url, params, ttl=ttl, today=today, stream=stream)
+    except Exception as e:
+        logger.error("Error getting %s for station %s", resource, station_id, exc_info=True)
+        return {"error": str(e)}
+    
+    if "error" in data:
+        logger.error("Error getting %s for station %s: %s", resource, station_id, data["error"])
+    else:
+        logger.info("Successfully retrieved %s for station %s", resource, station_id)
+    return data
+
+@functools.lru_cache(maxsize=256)
+def _datagetter_url(query: tuple) -> str:
+    """Encode a Data API query into a request URL, once per distinct query."""
+    return f"{DATA_URL}?{urlencode(query)}"
+
+async def _fetch_datagetter(
+    base_params: MappingProxyType,
+    station_id: str,
+    begin_date: Optional[str],
+    end_date: Optional[str],
+    ttl: float,
+    **params
+) -> Dict:
+    """
+    Fetch a data product for a station from the NOAA CO-OPS Data API.
+    
+    Args:
+        base_params: Parameter template for the product (e.g., _WATER_LEVEL_PARAMS)
+        station_id: The 7-digit station ID
+        begin_date: Start date in yyyyMMdd format, or None for today
+        end_date: End date in yyyyMMdd format, or None for today
+        ttl: Seconds to cache a successful response
+        **params: Additional product-specific query parameters
+    
+    Returns:
+        Dictionary containing the product data
+    """
+    if not _STATION_RE.fullmatch(station_id):
+        return {"error": f"Invalid station ID {station_id!r}: expected 7 digits"}
+    
+    today = not (begin_date and end_date)
+    dates = (("date", "today"),) if today else (("begin_date", begin_date), ("end_date", end_date))
+    url = _datagetter_url((*base_params.items(), ("station", station_id), *params.items(), *dates))
+    # Date ranges can return large data arrays, so decode those as they arrive
+    return await _get(url, None, ttl, base_params["product"], station_id, today=today, stream=not today)
+
 @mcp.tool()
 async def get_water_levels(
     station_id: str,
-    begin_date: str = None,
-    end_date: str = None,
+    begin_date: Optional[str] = None,
+    end_date: Optional[str] = None,
     datum: str = "MLLW",
     time_zone: str = "gmt",
     units: str = "english"
@@ -46,38 +371,16 @@ async def get_water_levels(
     Returns:
         Dictionary containing water level data
     """
-    logger.info(f"Getting water levels for station {station_id}")
-    try:
-        params = {
-            "station": station_id,
-            "product": "water_level",
-            "datum": datum,
-            "time_zone": time_zone,
-            "units": units,
-            "format": "json",
-            "application": "MCP_NOAA_Tides"
-        }
-        
-        if begin_date and end_date:
-            params["begin_date"] = begin_date
-            params["end_date"] = end_date
-        else:
-            params["date"] = "today"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(DATA_URL, params=params)
-            response.raise_for_status()
-            logger.info(f"Successfully retrieved water levels for station {station_id}")
-            return response.json()
-    except Exception as e:
-        logger.error(f"Error getting water levels for station {station_id}: {str(e)}")
-        return {"error": str(e)}
+    return await _fetch_datagetter(
+        _WATER_LEVEL_PARAMS, station_id, begin_date, end_date, WATER_LEVEL_TTL,
+        datum=datum, time_zone=time_zone, units=units
+    )
 
 @mcp.tool()
 async def get_tide_predictions(
     station_id: str,
-    begin_date: str = None,
-    end_date: str = None,
+    begin_date: Optional[str] = None,
+    end_date: Optional[str] = None,
     datum: str = "MLLW",
     time_zone: str = "gmt",
     units: str = "english",
@@ -98,80 +401,58 @@ async def get_tide_predictions(
     Returns:
         Dictionary containing tide predictions
     """
-    logger.info(f"Getting tide predictions for station {station_id}")
-    try:
-        params = {
-            "station": station_id,
-            "product": "predictions",
-            "datum": datum,
-            "time_zone": time_zone,
-            "units": units,
-            "interval": interval,
-            "format": "json",
-            "application": "MCP_NOAA_Tides"
-        }
-        
-        if begin_date and end_date:
-            params["begin_date"] = begin_date
-            params["end_date"] = end_date
-        else:
-            params["date"] = "today"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(DATA_URL, params=params)
-            response.raise_for_status()
-            logger.info(f"Successfully retrieved tide predictions for station {station_id}")
-            return response.json()
-    except Exception as e:
-        logger.error(f"Error getting tide predictions for station {station_id}: {str(e)}")
-        return {"error": str(e)}
+    return await _fetch_datagetter(
+        _PREDICTION_PARAMS, station_id, begin_date, end_date, PREDICTION_TTL,
+        datum=datum, time_zone=time_zone, units=units, interval=interval
+    )
 
 @mcp.tool()
-async def get_station_info(station_id: str, expand: List[str] = None) -> Dict:
+async def get_station_info(station_id: str, expand: Optional[List[str]] = None) -> Dict:
     """
     Get information about a specific station using the NOAA CO-OPS Metadata API.
     
     Args:
-        station_id: The 7-digit station ID
+        station_id: The station ID (7 digits, or alphanumeric for current stations)
         expand: List of additional resources to include (e.g., ["details", "sensors", "datums"])
     
     Returns:
         Dictionary containing station information including available products
     """
-    logger.info(f"Getting station info for station {station_id}")
-    try:
-        # Construct the base URL with the station ID and .json extension
-        url = f"{METADATA_URL}/{station_id}.json"
-        
-        # Add expand parameter to get products information
-        params = {"expand": "products"}
-        if expand:
-            params["expand"] = f"products,{','.join(expand)}"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Add available products information
-            if "stations" in data and len(data["stations"]) > 0:
-                station = data["stations"][0]
-                available_products = {
-                    "tide_predictions": any(
-                        product["name"] == "Tide Predictions" 
-                        for product in station.get("products", {}).get("products", [])
-                    ),
-                    "water_levels": station.get("observedst", False),
-                    "currents": station.get("type") == "currents",
-                    "is_active": station.get("observedst", False)
-                }
-                station["available_products"] = available_products
-            
-            logger.info(f"Successfully retrieved station info for station {station_id}")
-            return data
-    except Exception as e:
-        logger.error(f"Error getting station info for station {station_id}: {str(e)}")
-        return {"error": str(e)}
+    if not _METADATA_STATION_RE.fullmatch(station_id):
+        return {"error": f"Invalid station ID {station_id!r}: expected letters and digits"}
+    
+    # Always expand products so available products can be summarized
+    params = {"expand": "products"}
+    if expand:
+        params["expand"] = f"products,{','.join(expand)}"
+    
+    url = f"{METADATA_URL}/{station_id}.json"
+    data = await _get(url, params, STATION_INFO_TTL, "station info", station_id)
+    
+    # Add available products information
+    if data.get("stations"):
+        station = data["stations"][0]
+        station["available_products"] = _available_products(station)
+    return data
+
+@mcp.tool()
+async def get_station_summary(station_id: str, date: Optional[str] = None) -> Dict:
+    """
+    Get station information and tide predictions for a station in one call.
+    
+    Args:
+        station_id: The 7-digit station ID
+        date: Date in yyyyMMdd format for the predictions (optional, defaults to today)
+    
+    Returns:
+        Dictionary with the station information under "info" and tide predictions under "predictions"
+    """
+    # The two lookups are independent, so run them concurrently
+    info, predictions = await asyncio.gather(
+        get_station_info(station_id),
+        get_tide_predictions(station_id, begin_date=date, end_date=date)
+    )
+    return {"info": info, "predictions": predictions}
 
 @mcp.tool()
 async def search_stations(query: str) -> Dict:
@@ -184,71 +465,61 @@ async def search_stations(query: str) -> Dict:
     Returns:
         Dictionary containing matching stations
     """
-    logger.info(f"Searching for stations matching: {query}")
+    logger.info("Searching for stations matching: %s", query)
     try:
-        # First get all stations
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{METADATA_URL}.json")
-            response.raise_for_status()
-            data = response.json()
-            
-            # Split query into parts (e.g., "Cambridge, MD" -> ["cambridge", "md"])
-            query_parts = [part.strip().lower() for part in query.split(',')]
-            matching_stations = []
-            
-            if "stations" in data:
-                for station in data["stations"]:
-                    # Get station details
-                    station_name = station.get("name", "").lower()
-                    state = station.get("state", "").lower()
-                    lat = station.get("lat", 0)
-                    lng = station.get("lng", 0)
-                    
-                    # Check if any query part matches station name or state
-                    matches = False
-                    for part in query_parts:
-                        if (part in station_name or 
-                            part in state or 
-                            (len(part) > 2 and part in station_name.split())):
-                            matches = True
-                            break
-                    
-                    if matches:
-                        # Add available products information
-                        available_products = {
-                            "tide_predictions": any(
-                                product["name"] == "Tide Predictions" 
-                                for product in station.get("products", {}).get("products", [])
-                            ),
-                            "water_levels": station.get("observedst", False),
-                            "currents": station.get("type") == "currents",
-                            "is_active": station.get("observedst", False)
-                        }
-                        station["available_products"] = available_products
-                        matching_stations.append(station)
-            
-            # Sort stations by relevance (exact matches first)
-            matching_stations.sort(key=lambda x: (
-                not any(part == x.get("name", "").lower() for part in query_parts),
-                not any(part == x.get("state", "").lower() for part in query_parts)
-            ))
-            
-            logger.info(f"Found {len(matching_stations)} matching stations")
-            return {
-                "stations": matching_stations,
-                "count": len(matching_stations)
-            }
+        catalog = await _get_station_catalog()
+        stations = catalog["stations"]
+        meta = catalog["meta"]
+        
+        # Split query into parts (e.g., "Cambridge, MD" -> ["cambridge", "md"])
+        query_parts = [part.strip().lower() for part in query.split(',')]
+        
+        # Stations whose name or state contain every query token
+        tokens = _TOKEN_RE.findall(query.lower())
+        matches = set()
+        if tokens:
+            matches = set.intersection(*(catalog["index"].get(token, set()) for token in tokens))
+        
+        # Fall back to matching any query part as a substring of name or state,
+        # with one compiled pattern per query rather than a check per part
+        if not matches:
+            search = re.compile("|".join(re.escape(part) for part in query_parts)).search
+            matches = {i for i, fields in enumerate(meta) if search(fields["search_text"])}
+        
+        # Score relevance once per match (exact name, then exact state, first).
+        # Methods are bound outside the loop to skip attribute lookups per station.
+        query_parts_set = frozenset(query_parts)
+        scored = []
+        append = scored.append
+        for i in sorted(matches):
+            fields = meta[i]
+            score = 0
+            if fields["name_lc"] in query_parts_set: score -= 2
+            if fields["state_lc"] in query_parts_set: score -= 1
+            append((score, stations[i]))
+        scored.sort(key=operator.itemgetter(0))
+        matching_stations = [station for _, station in scored]
+        
+        logger.info("Found %d matching stations", len(matching_stations))
+        return {
+            "stations": matching_stations,
+            "count": len(matching_stations)
+        }
     except Exception as e:
-        logger.error(f"Error searching for stations: {str(e)}")
+        logger.error("Error searching for stations", exc_info=True)
         return {"error": str(e)}
 
 async def main():
     try:
         logger.info("Starting MCP server...")
+        # Warm the station search index while the server starts
+        _refresh_station_catalog()
         await mcp.run_stdio_async()
-    except Exception as e:
-        logger.error(f"Error running server: {e}")
+    except Exception:
+        logger.error("Error running server", exc_info=True)
         sys.exit(1)
+    finally:
+        await _client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
@@ -0,0 +1,23 @@
+import asyncio
+import pytest
+import server
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """Run async tests on uvloop, as the server does, when it is installed."""
+    return uvloop.EventLoopPolicy() if uvloop else asyncio.DefaultEventLoopPolicy()
+
+@pytest.fixture(autouse=True)
+def clear_response_cache(monkeypatch):
+    """Start every test with an empty NOAA response cache and station catalog."""
+    server._cache.clear()
+    server._catalog.clear()
+    monkeypatch.setattr(server, "_catalog_task", None)
+    yield
+    server._cache.clear()
+    server._catalog.clear()
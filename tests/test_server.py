@@ -1,11 +1,23 @@
+import asyncio
 import pytest
-from httpx import Response
 import json
-from datetime import datetime
+from types import MappingProxyType
+from pytest_httpx import IteratorStream
 import server
 
-# Sample response data
-SAMPLE_WATER_LEVEL_DATA = {
+DATA_URL, METADATA_URL = server.DATA_URL, server.METADATA_URL
+
+# Run this module's tests on one event loop rather than a new loop per test,
+# and keep them together on one worker under 'pytest -n auto --dist=loadgroup'
+# so they share that loop. (Every xdist worker still imports server.)
+pytestmark = [
+    pytest.mark.xdist_group("server_io"),
+    pytest.mark.asyncio(loop_scope="module")
+]
+
+# Sample response data, read-only so no test can change it for the others.
+# pytest-httpx copies and encodes json= bodies, so tests pass dict(...) copies.
+SAMPLE_WATER_LEVEL_DATA = MappingProxyType({
     "metadata": {
         "id": "9414290",
         "name": "San Francisco",
@@ -20,9 +32,9 @@ SAMPLE_WATER_LEVEL_DATA = {
             "f": "0,0,0,0"
         }
     ]
-}
+})
 
-SAMPLE_PREDICTIONS_DATA = {
+SAMPLE_PREDICTIONS_DATA = MappingProxyType({
     "predictions": [
         {
             "t": "2024-03-20 00:00",
@@ -30,9 +42,9 @@ SAMPLE_PREDICTIONS_DATA = {
             "type": "H"
         }
     ]
-}
+})
 
-SAMPLE_STATION_INFO = {
+SAMPLE_STATION_INFO = MappingProxyType({
     "stations": [
         {
             "id": "9414290",
@@ -45,51 +57,145 @@ SAMPLE_STATION_INFO = {
             "timezone": "LST/LDT"
         }
     ]
-}
+})
 
-@pytest.mark.asyncio
-async def test_get_water_levels(httpx_mock):
-    """Test getting water level data."""
-    # Mock the NOAA API response
-    httpx_mock.add_response(
-        url=f"{server.DATA_URL}?station=9414290&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&date=today",
-        json=SAMPLE_WATER_LEVEL_DATA
-    )
+SAMPLE_STATION_CATALOG = MappingProxyType({
+    "stations": [
+        {
+            "id": "8571892",
+            "name": "Cambridge",
+            "state": "MD",
+            "lat": 38.5725,
+            "lng": -76.0617,
+            "type": "waterlevels",
+            "observedst": True,
+            "timezonecorr": -5,
+            "shefcode": "CAMM2"
+        },
+        {
+            "id": "8575512",
+            "name": "Annapolis",
+            "state": "MD",
+            "lat": 38.9833,
+            "lng": -76.4816,
+            "type": "waterlevels",
+            "observedst": True
+        },
+        {
+            "id": "8447386",
+            "name": "Fall River",
+            "state": "MA",
+            "lat": 41.7043,
+            "lng": -71.1641,
+            "type": "waterlevels",
+            "observedst": True
+        }
+    ]
+})
+
+# Mocked NOAA request URLs
+WATER_LEVELS_TODAY_URL = f"{DATA_URL}?station=9414290&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&date=today"
+WATER_LEVELS_RANGE_URL = f"{DATA_URL}?station=9414290&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&begin_date=20240320&end_date=20240321"
+PREDICTIONS_TODAY_URL = f"{DATA_URL}?station=9414290&product=predictions&datum=MLLW&time_zone=gmt&units=english&interval=hilo&format=json&application=MCP_NOAA_Tides&date=today"
+PREDICTIONS_DAY_URL = f"{DATA_URL}?station=9414290&product=predictions&datum=MLLW&time_zone=gmt&units=english&interval=hilo&format=json&application=MCP_NOAA_Tides&begin_date=20240320&end_date=20240320"
+STATION_INFO_URL = f"{METADATA_URL}/9414290.json?expand=products"
+STATION_INFO_EXPANDED_URL = f"{METADATA_URL}/9414290.json?expand=products,details,sensors"
+STATION_CATALOG_URL = f"{METADATA_URL}.json"
+
+@pytest.fixture(scope="session")
+def expanded_station_info():
+    """Station info with products, details and sensors expanded, built once per run."""
+    return MappingProxyType({
+        "stations": [
+            {
+                **SAMPLE_STATION_INFO["stations"][0],
+                "observedst": True,
+                "products": {
+                    "products": [
+                        {"name": "Tide Predictions"},
+                        {"name": "Water Levels"}
+                    ]
+                },
+                "details": {
+                    "state": "CA",
+                    "county": "San Francisco",
+                    "timezone": "LST/LDT"
+                },
+                "sensors": [
+                    {
+                        "type": "water_level",
+                        "status": "active"
+                    }
+                ]
+            }
+        ]
+    })
+
+@pytest.fixture
+def noaa_responses(httpx_mock):
+    """Mock today's water levels, tide predictions and station info for 9414290."""
+    httpx_mock.add_response(url=WATER_LEVELS_TODAY_URL, json=dict(SAMPLE_WATER_LEVEL_DATA))
+    httpx_mock.add_response(url=PREDICTIONS_TODAY_URL, json=dict(SAMPLE_PREDICTIONS_DATA))
+    httpx_mock.add_response(url=STATION_INFO_URL, json=dict(SAMPLE_STATION_INFO))
+    return httpx_mock
+
+@pytest.mark.parametrize("tool,url,payload,key", [
+    pytest.param(server.get_water_levels, WATER_LEVELS_TODAY_URL, SAMPLE_WATER_LEVEL_DATA, "data", id="water_levels"),
+    pytest.param(server.get_tide_predictions, PREDICTIONS_TODAY_URL, SAMPLE_PREDICTIONS_DATA, "predictions", id="tide_predictions"),
+    pytest.param(server.get_station_info, STATION_INFO_URL, SAMPLE_STATION_INFO, "stations", id="station_info"),
+])
+async def test_get_station_data(httpx_mock, tool, url, payload, key):
+    """Test that each data tool requests its NOAA URL and returns the records."""
+    httpx_mock.add_response(url=url, json=dict(payload))
     
-    result = await server.get_water_levels("9414290")
-    assert result == SAMPLE_WATER_LEVEL_DATA
-    assert result["metadata"]["id"] == "9414290"
-    assert "data" in result
-    assert len(result["data"]) > 0
+    result = await tool("9414290")
+    assert key in result
+    assert len(result[key]) > 0
+    # Station info adds available_products to each record, so compare as a subset
+    assert result[key][0].items() >= payload[key][0].items()
+
+async def test_all_endpoints_concurrent(httpx_mock, noaa_responses):
+    """Test that the data tools can be awaited concurrently on one client."""
+    water_levels, predictions, info = await asyncio.gather(
+        server.get_water_levels("9414290"),
+        server.get_tide_predictions("9414290"),
+        server.get_station_info("9414290")
+    )
+    assert water_levels["metadata"]["id"] == "9414290"
+    assert len(water_levels["data"]) == 1
+    assert len(predictions["predictions"]) == 1
+    assert info["stations"][0]["id"] == "9414290"
+    assert len(httpx_mock.get_requests()) == 3
 
-@pytest.mark.asyncio
 async def test_get_water_levels_with_dates(httpx_mock):
     """Test getting water level data with specific dates."""
     begin_date = "20240320"
     end_date = "20240321"
     
     httpx_mock.add_response(
-        url=f"{server.DATA_URL}?station=9414290&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&begin_date={begin_date}&end_date={end_date}",
-        json=SAMPLE_WATER_LEVEL_DATA
+        url=WATER_LEVELS_RANGE_URL,
+        json=dict(SAMPLE_WATER_LEVEL_DATA)
     )
     
     result = await server.get_water_levels("9414290", begin_date=begin_date, end_date=end_date)
-    assert result == SAMPLE_WATER_LEVEL_DATA
+    assert result["metadata"]["id"] == "9414290"
+    assert len(result["data"]) == 1
 
-@pytest.mark.asyncio
-async def test_get_tide_predictions(httpx_mock):
-    """Test getting tide predictions."""
+async def test_get_water_levels_streams_large_ranges(httpx_mock):
+    """Test that a long date range is decoded correctly from a chunked body."""
+    sample = SAMPLE_WATER_LEVEL_DATA["data"][0]
+    payload = {**SAMPLE_WATER_LEVEL_DATA, "data": [sample] * 10000}
+    body = json.dumps(payload).encode()
     httpx_mock.add_response(
-        url=f"{server.DATA_URL}?station=9414290&product=predictions&datum=MLLW&time_zone=gmt&units=english&interval=hilo&format=json&application=MCP_NOAA_Tides&date=today",
-        json=SAMPLE_PREDICTIONS_DATA
+        url=WATER_LEVELS_RANGE_URL,
+        stream=IteratorStream([body[i:i + 4096] for i in range(0, len(body), 4096)])
     )
     
-    result = await server.get_tide_predictions("9414290")
-    assert result == SAMPLE_PREDICTIONS_DATA
-    assert "predictions" in result
-    assert len(result["predictions"]) > 0
+    result = await server.get_water_levels("9414290", begin_date="20240320", end_date="20240321")
+    assert result["metadata"]["id"] == "9414290"
+    assert len(result["data"]) == 10000
+    assert result["data"][-1] == sample
 
-@pytest.mark.asyncio
 async def test_get_station_info(httpx_mock):
     """Test getting station information."""
     # Update sample data to include products information
@@ -116,7 +222,7 @@ async def test_get_station_info(httpx_mock):
     }
     
     httpx_mock.add_response(
-        url=f"{server.METADATA_URL}/9414290.json?expand=products",
+        url=STATION_INFO_URL,
         json=sample_station_info
     )
     
@@ -128,45 +234,22 @@ async def test_get_station_info(httpx_mock):
     assert result["stations"][0]["available_products"]["water_levels"] is True
     assert result["stations"][0]["available_products"]["is_active"] is True
 
-@pytest.mark.asyncio
-async def test_get_station_info_with_expand(httpx_mock):
-    """Test getting station information with expanded resources."""
-    expanded_info = {
-        "stations": [
-            {
-                "id": "9414290",
-                "name": "San Francisco",
-                "lat": "37.8063",
-                "lon": "-122.4659",
-                "state": "CA",
-                "type": "waterlevels",
-                "timezonecorr": "-8",
-                "timezone": "LST/LDT",
-                "observedst": True,
-                "products": {
-                    "products": [
-                        {"name": "Tide Predictions"},
-                        {"name": "Water Levels"}
-                    ]
-                },
-                "details": {
-                    "state": "CA",
-                    "county": "San Francisco",
-                    "timezone": "LST/LDT"
-                },
-                "sensors": [
-                    {
-                        "type": "water_level",
-                        "status": "active"
-                    }
-                ]
-            }
-        ]
-    }
+async def test_get_station_info_current_station(httpx_mock):
+    """Test getting information for a current station, which has an alphanumeric ID."""
+    httpx_mock.add_response(
+        url=f"{METADATA_URL}/cb0102.json?expand=products",
+        json={"stations": [{"id": "cb0102", "name": "Cape Henry LB 2CH", "type": "currents"}]}
+    )
     
+    result = await server.get_station_info("cb0102")
+    assert result["stations"][0]["id"] == "cb0102"
+    assert result["stations"][0]["available_products"]["currents"] is True
+
+async def test_get_station_info_with_expand(httpx_mock, expanded_station_info):
+    """Test getting station information with expanded resources."""
     httpx_mock.add_response(
-        url=f"{server.METADATA_URL}/9414290.json?expand=products,details,sensors",
-        json=expanded_info
+        url=STATION_INFO_EXPANDED_URL,
+        json=dict(expanded_station_info)
     )
     
     result = await server.get_station_info("9414290", expand=["details", "sensors"])
@@ -178,34 +261,124 @@ async def test_get_station_info_with_expand(httpx_mock):
     assert result["stations"][0]["available_products"]["water_levels"] is True
     assert result["stations"][0]["available_products"]["is_active"] is True
 
-@pytest.mark.asyncio
-async def test_error_handling(httpx_mock):
-    """Test error handling when API calls fail."""
-    # Mock a failed API response
-    httpx_mock.add_response(status_code=404)
+@pytest.mark.parametrize("tool,station_id,kwargs,status", [
+    pytest.param(server.get_water_levels, "0000000", {}, 404, id="not_found"),
+    pytest.param(server.get_water_levels, "9414290", {"begin_date": "invalid_date"}, 400, id="bad_date"),
+    # Malformed station IDs are rejected without calling the API
+    pytest.param(server.get_water_levels, "invalid", {}, None, id="bad_station"),
+    pytest.param(server.get_station_info, "9414290/../stations", {}, None, id="bad_metadata_station"),
+])
+async def test_error_handling(httpx_mock, tool, station_id, kwargs, status):
+    """Test that failed API calls and invalid parameters return an error message."""
+    if status:
+        httpx_mock.add_response(status_code=status)
     
-    result = await server.get_water_levels("invalid_station")
-    assert "error" in result
+    result = await tool(station_id, **kwargs)
     assert isinstance(result["error"], str)
+    if status:
+        assert result["error"].startswith(f"HTTP {status}")
+    assert len(httpx_mock.get_requests()) == (1 if status else 0)
 
-@pytest.mark.asyncio
-async def test_invalid_parameters(httpx_mock):
-    """Test handling of invalid parameters."""
-    # Mock responses for invalid parameters
+async def test_repeated_calls_are_cached(httpx_mock):
+    """Test that repeated calls with the same parameters reuse the cached response."""
     httpx_mock.add_response(
-        url=f"{server.DATA_URL}?station=9414290&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&date=today",
-        status_code=400
+        url=PREDICTIONS_TODAY_URL,
+        json=dict(SAMPLE_PREDICTIONS_DATA)
     )
     
+    first = await server.get_tide_predictions("9414290")
+    second = await server.get_tide_predictions("9414290")
+    assert first is second
+    assert len(first["predictions"]) == 1
+    assert len(httpx_mock.get_requests()) == 1
+
+async def test_search_stations(httpx_mock):
+    """Test searching the station catalog by name and state."""
+    httpx_mock.add_response(
+        url=STATION_CATALOG_URL,
+        json=dict(SAMPLE_STATION_CATALOG)
+    )
+    
+    result = await server.search_stations("Cambridge, MD")
+    assert result["count"] == 1
+    assert result["stations"][0]["id"] == "8571892"
+    assert result["stations"][0]["available_products"]["water_levels"] is True
+    assert "shefcode" not in result["stations"][0]
+    
+    # The indexed catalog is reused, and partial names fall back to substring matching
+    result = await server.search_stations("annap")
+    assert [station["id"] for station in result["stations"]] == ["8575512"]
+    assert len(httpx_mock.get_requests()) == 1
+
+async def test_search_stations_relevance_order(httpx_mock):
+    """Test that exact name matches sort ahead of exact state matches."""
     httpx_mock.add_response(
-        url=f"{server.DATA_URL}?station=invalid&product=water_level&datum=MLLW&time_zone=gmt&units=english&format=json&application=MCP_NOAA_Tides&date=today",
-        status_code=400
+        url=STATION_CATALOG_URL,
+        json=dict(SAMPLE_STATION_CATALOG)
     )
     
-    # Test with invalid date format
-    result = await server.get_water_levels("9414290", begin_date="invalid_date")
-    assert "error" in result
+    result = await server.search_stations("Fall River, MD")
+    assert [station["id"] for station in result["stations"]] == ["8447386", "8571892", "8575512"]
 
-    # Test with invalid station ID
-    result = await server.get_water_levels("invalid")
-    assert "error" in result 
\ No newline at end of file
+async def test_today_cache_rolls_over_at_midnight(httpx_mock, monkeypatch):
+    """Test that cached date=today responses are not reused on the next day."""
+    httpx_mock.add_response(
+        url=PREDICTIONS_TODAY_URL,
+        json=dict(SAMPLE_PREDICTIONS_DATA),
+        is_reusable=True
+    )
+    
+    monkeypatch.setattr(server, "_utc_today", lambda: "20240320")
+    await server.get_tide_predictions("9414290")
+    await server.get_tide_predictions("9414290")
+    monkeypatch.setattr(server, "_utc_today", lambda: "20240321")
+    await server.get_tide_predictions("9414290")
+    assert len(httpx_mock.get_requests()) == 2
+
+async def test_cache_expires_after_ttl(httpx_mock, monkeypatch):
+    """Test that cached water levels are refetched once their TTL has passed."""
+    httpx_mock.add_response(
+        url=WATER_LEVELS_TODAY_URL,
+        json=dict(SAMPLE_WATER_LEVEL_DATA),
+        is_reusable=True
+    )
+    
+    now_ns = 0
+    monkeypatch.setattr(server, "_now_ns", lambda: now_ns)
+    await server.get_water_levels("9414290")
+    now_ns = (server.WATER_LEVEL_TTL - 1) * server._NS_PER_SECOND
+    await server.get_water_levels("9414290")
+    assert len(httpx_mock.get_requests()) == 1
+    
+    now_ns = (server.WATER_LEVEL_TTL + 1) * server._NS_PER_SECOND
+    await server.get_water_levels("9414290")
+    assert len(httpx_mock.get_requests()) == 2
+
+async def test_get_station_summary(httpx_mock):
+    """Test getting station information and tide predictions together."""
+    httpx_mock.add_response(
+        url=STATION_INFO_URL,
+        json=dict(SAMPLE_STATION_INFO)
+    )
+    httpx_mock.add_response(
+        url=PREDICTIONS_DAY_URL,
+        json=dict(SAMPLE_PREDICTIONS_DATA)
+    )
+    
+    result = await server.get_station_summary("9414290", date="20240320")
+    assert result["info"]["stations"][0]["id"] == "9414290"
+    assert len(result["predictions"]["predictions"]) == 1
+
+async def test_tools_reuse_shared_client(httpx_mock, monkeypatch):
+    """Test that tools send requests through the module's shared HTTP client."""
+    httpx_mock.add_response(
+        url=PREDICTIONS_TODAY_URL,
+        json=dict(SAMPLE_PREDICTIONS_DATA)
+    )
+    
+    def no_new_clients(*args, **kwargs):
+        raise AssertionError("tools should not create their own httpx.AsyncClient")
+    monkeypatch.setattr(server.httpx, "AsyncClient", no_new_clients)
+    
+    result = await server.get_tide_predictions("9414290")
+    assert len(result["predictions"]) == 1